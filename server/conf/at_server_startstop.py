@@ -30,7 +30,12 @@ def at_server_start():
     This is called every time the server starts up, regardless of
     how it was shut down.
     """
-    pass
+    # Plant timers only live in memory, so re-arm them on every start.
+    # Delayed so ON_DEMAND_HANDLER has loaded its tasks first.
+    from evennia.utils import delay
+    from typeclasses.plants import schedule_all_plants
+
+    delay(0, schedule_all_plants)
 
 
 def at_server_stop():
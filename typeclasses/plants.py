@@ -1,14 +1,113 @@
+import heapq
+from itertools import count
+from time import time
 from world.prototypes import SEED_PROTOTYPES
-from evennia import ON_DEMAND_HANDLER, create_object, utils, spawn
+from django.db import transaction
+from evennia import ON_DEMAND_HANDLER, create_object, search_object, utils, spawn
+from evennia.utils import logger
 from .objects import Object
 from typeclasses.compost import Compost
 from random import random, randint
 
+try:
+    from random import binomialvariate
+except ImportError:
+    # binomialvariate finns först från Python 3.12
+    def binomialvariate(n=1, p=0.5):
+        return sum(1 for _ in range(n) if random() < p)
+
+
+class PlantScheduler:
+    """
+    Gemensam schemaläggare för växternas timers.
+
+    Istället för en utils.delay per växt ligger alla väntande anrop i en
+    min-heap, och bara det närmast förestående anropet har en aktiv timer.
+    Objekten sparas som dbref och slås upp igen när det är dags, så att
+    borttagna objekt helt enkelt hoppas över.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = count()
+        self._task = None
+        self._next_due = None
+
+    def schedule(self, obj, delay, method, *args):
+        """Anropa `obj.<method>(*args)` om `delay` sekunder."""
+        due = time() + delay
+        heapq.heappush(self._heap, (due, next(self._counter), obj.dbref, method, args))
+        if self._next_due is None or due < self._next_due:
+            self._start_timer(due)
+
+    def _start_timer(self, due):
+        """Ersätt den aktiva timern med en som går vid `due`."""
+        if self._task is not None:
+            self._task.cancel()
+        self._next_due = due
+        self._task = utils.delay(max(0, due - time()), self._tick)
+
+    def _tick(self):
+        """Kör alla anrop som har förfallit och starta nästa timer."""
+        self._task = None
+        self._next_due = None
+        now = time()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, dbref, method, args = heapq.heappop(self._heap)
+            found = search_object(dbref)
+            if not found:
+                continue
+            try:
+                getattr(found[0], method)(*args)
+            except Exception:
+                logger.log_trace(f"PlantScheduler: {dbref}.{method} failed")
+        if self._heap:
+            self._start_timer(self._heap[0][0])
+
+
+PLANT_SCHEDULER = PlantScheduler()
+
+# Växter (dbref) vars tillväxt redan ligger i PLANT_SCHEDULER. Hålls på
+# modulnivå, inte i ndb, så att en tömd idmapper-cache inte schemalägger
+# samma stadier en gång till. Töms naturligt vid omstart, precis som heapen.
+_GROWTH_ARMED = set()
+
+
 class Plant(Object):
     """
     Växtklass med schemalagd kompostering vid död.
     """
-    
+
+    # Tillväxtstadier, snabba tider för testning (i sekunder)
+    GROWTH_STAGES = {
+        0: "seed",
+        30: "sprout",
+        60: "young",
+        90: "mature",
+        120: "flowering",  # Börja producera frön
+        150: "harvestable",  # Full med frön
+        180: "withering",  # Släpper frön
+        210: "dead"
+    }
+
+    # Statiska beskrivningar per stadium
+    _STAGE_DESC_STATIC = {
+        "seed": "Ett litet frö som precis planterats.",
+        "sprout": "En späd grodd som just tittat upp ur jorden.",
+        "young": "En ung och livskraftig planta.",
+        "mature": "En stark och fullvuxen växt.",
+        "withering": "En vissnande växt som har sett bättre dagar."
+    }
+
+    # Beskrivningar som beror på antalet frukter
+    _STAGE_DESC_FRUIT_FMT = {
+        "flowering": "En vacker blomstrande växt med {fruits} knoppar.",
+        "harvestable": "En mogen växt redo att skördas med {fruits} frukter."
+    }
+
+    # Attribut som speglas i ndb.state, bara de som visningen läser
+    _STATE_KEYS = ("stage", "fruits")
+
     def at_object_creation(self):
         """Sätt grundläggande attribut för växten."""
         super().at_object_creation()
@@ -18,70 +117,146 @@ class Plant(Object):
         self.db.health = 100
         self.db.fruits = 0
         self.db.seeds = 0
-        
-        # Snabba tider för testning (i sekunder)
-        self.growth_stages = {
-            0: "seed",
-            30: "sprout",
-            60: "young",
-            90: "mature",
-            120: "flowering",  # Börja producera frön
-            150: "harvestable",  # Full med frön
-            180: "withering",  # Släpper frön
-            210: "dead"
-        }
-        
-        # Starta tillväxtcykeln
+
+        # Starta tillväxtcykeln. Starttiden sparas på växten så att
+        # schemaläggningen inte beror på när ON_DEMAND_HANDLER laddas.
+        self.db.growth_start_ts = time()
         try:
             ON_DEMAND_HANDLER.add(
-                self,
+                self.dbref,
                 category="plant_growth",
-                stages=self.growth_stages
+                stages=self.GROWTH_STAGES
             )
-            
-            # Schemalägga transformationen till kompost
-            seed_scatter_time = 180  # När växten börjar vissna
-            death_time = 210  # Tiden till död i sekunder
+            self.schedule_growth()
 
-            utils.delay(seed_scatter_time, self.scatter_seeds)
-            utils.delay(death_time, self.transform_to_compost)
-            
         except Exception as e:
             self.msg(f"Error starting growth: {e}")
 
+    def at_init(self):
+        """
+        Körs när växten laddas in i minnet.
+
+        Vid serverstart schemaläggs alla växter av schedule_all_plants; det
+        här fångar växter som laddas senare. Redan schemalagda hoppas över.
+        """
+        super().at_init()
+        try:
+            self.schedule_growth()
+        except Exception:
+            logger.log_trace(f"Could not reschedule growth for {self.dbref}")
+
+    def schedule_growth(self):
+        """
+        Schemalägg växtens återstående stadiebyten och komposteringen.
+
+        Tiden räknas från växtens sparade starttid, db.growth_start_ts.
+        Äldre växter utan starttid läser den från ON_DEMAND_HANDLER en gång
+        och sparar den. Stadier som hann passera medan växten inte var
+        schemalagd körs direkt och i ordning. Stadiet "dead" sköts av
+        transform_to_compost, och vissnandet sprider fröna via update_stage.
+
+        Varje växt schemaläggs högst en gång per serverprocess.
+        """
+        if self.dbref in _GROWTH_ARMED:
+            return
+        start = self.db.growth_start_ts
+        if start is None:
+            elapsed = ON_DEMAND_HANDLER.get_dt(self.dbref, category="plant_growth")
+            if elapsed is None:
+                # Tidigare uppgifter lades till under växtens namn
+                elapsed = ON_DEMAND_HANDLER.get_dt(self, category="plant_growth")
+            if elapsed is None:
+                logger.log_warn(f"Plant {self.dbref} has no growth start time, not scheduled.")
+                return
+            start = self.db.growth_start_ts = time() - elapsed
+        elapsed = time() - start
+        _GROWTH_ARMED.add(self.dbref)
+
+        stages = list(self.GROWTH_STAGES.values())
+        current_stage = self.db.stage
+        current = stages.index(current_stage) if current_stage in stages else 0
+
+        for index, (stage_time, stage) in enumerate(self.GROWTH_STAGES.items()):
+            delay = max(0, stage_time - elapsed)
+            if stage == "dead":
+                PLANT_SCHEDULER.schedule(self, delay, "transform_to_compost")
+            elif index > current:
+                PLANT_SCHEDULER.schedule(self, delay, "update_stage", stage)
+
+    def get_seed_proto_key(self):
+        """
+        Returnera nyckeln i SEED_PROTOTYPES för växtens frön.
+        """
+        proto_key = self.ndb.seed_proto_key
+        if proto_key is None:
+            proto_key = self.ndb.seed_proto_key = f"{self.key.upper()}_SEED"
+        return proto_key
+
+    def get_state(self):
+        """
+        Returnera en cachad ögonblicksbild av stage och fruits för visning.
+
+        Byggs från databasen första gången. update_stage är den enda kodväg
+        som skriver de attributen och uppdaterar den samtidigt. Ändras de på
+        annat sätt, t.ex. med set, måste ndb.state tömmas (sättas till None)
+        för att ögonblicksbilden ska läsas om.
+        """
+        state = self.ndb.state
+        if state is None:
+            state = self.ndb.state = {
+                key: self.attributes.get(key) for key in self._STATE_KEYS
+            }
+        return state
+
     def update_stage(self, stage):
         """
         Uppdatera växtens tillstånd baserat på stadium.
         """
-        self.db.stage = stage
-        
+        # Inget att göra om stadiet redan är sparat
+        if self.db.stage == stage:
+            return
+
+        # Samla alla ändringar och skriv dem i ett enda anrop
+        updates = {"stage": stage}
+
         match stage:
             case "seed":
-                self.db.health = 100
-                self.db.fruits = 0
-                self.db.seeds = 0
+                updates.update(health=100, fruits=0, seeds=0)
             case "sprout":
-                self.db.size = 2
+                updates["size"] = 2
             case "young":
-                self.db.size = 3
+                updates["size"] = 3
             case "mature":
-                self.db.size = 4
+                updates["size"] = 4
             case "flowering":
                 if self.db.fruits == 0:
-                    self.db.fruits = randint(1, 3)
+                    updates["fruits"] = randint(1, 3)
                 if self.db.seeds == 0:
-                    self.db.seeds = randint(2, 5)
+                    updates["seeds"] = randint(2, 5)
             case "harvestable":
-                if self.db.seeds < 5:
-                    self.db.seeds += randint(1, 3)
+                seeds = self.db.seeds
+                if seeds < 5:
+                    updates["seeds"] = seeds + randint(1, 3)
             case "withering":
-                self.db.health = 50
-                self.scatter_seeds()
+                updates["health"] = 50
+
+        self.attributes.batch_add(*updates.items())
+        state = self.get_state()
+        for key in self._STATE_KEYS:
+            if key in updates:
+                state[key] = updates[key]
+
+        # Fröspridningen läser seeds, så den körs först när allt är sparat
+        if stage == "withering":
+            self.scatter_seeds()
 
     def scatter_seeds(self):
         """Sprid frön automatiskt om de inte skördas"""
-        # Kolla om frön redan spridits
-        if hasattr(self.db, "seeds_scattered") and self.db.seeds_scattered:
+        # Kolla om frön redan spridits, först i minnet och sedan i databasen
+        if self.ndb.seeds_scattered:
+            return
+        if self.db.seeds_scattered:
+            self.ndb.seeds_scattered = True
             return
 
         if self.db.seeds == 0:
@@ -91,19 +266,18 @@ class Plant(Object):
             seeds_to_scatter = self.db.seeds
             success_chance = 0.7  # 70% chans att fröet överlever
 
+            proto = SEED_PROTOTYPES[self.get_seed_proto_key()]
+            survivors = binomialvariate(seeds_to_scatter, success_chance)
+
             scattered = 0
-            for _ in range(seeds_to_scatter):
-                if random() < success_chance:
-                    proto = SEED_PROTOTYPES[f"{self.key.upper()}_SEED"].copy()
-                    try:
-                        # Skapa fröet och sätt dess plats explicit
-                        seed = spawn(proto)[0]
+            if survivors:
+                try:
+                    # Skapa alla frön i ett anrop och sätt deras plats explicit
+                    for seed in spawn(*([proto] * survivors)):
                         seed.move_to(self.location, quiet=True)
                         scattered += 1
-                        # Debug meddelande
-                        self.location.msg_contents(f"DEBUG: Seed location: {seed.location}")
-                    except Exception as e:
-                        self.location.msg_contents(f"Error creating seed: {e}")
+                except Exception as e:
+                    self.location.msg_contents(f"Error creating seed: {e}")
 
             if scattered > 0:
                 self.location.msg_contents(
@@ -111,6 +285,7 @@ class Plant(Object):
                 )
             self.db.seeds = 0
             self.db.seeds_scattered = True  # Markera att frön har spridits.
+            self.ndb.seeds_scattered = True
 
     def harvest_seeds(self, harvester):
         """Låt spelare skörda frön"""
@@ -121,9 +296,11 @@ class Plant(Object):
             return False, "This plant has no seeds to harvest."
             
         num_seeds = self.db.seeds
-        for _ in range(num_seeds):
-            seed = spawn(SEED_PROTOTYPES[f"{self.key.upper()}_SEED"], location=harvester)[0]
-            
+        proto = SEED_PROTOTYPES[self.get_seed_proto_key()]
+        # Skapa alla frön i ett anrop och lägg dem hos skördaren
+        for seed in spawn(*([proto] * num_seeds)):
+            seed.move_to(harvester, quiet=True)
+
         self.db.seeds = 0
         return True, f"You harvest {num_seeds} seeds from the {self.key}."
 
@@ -138,55 +315,70 @@ class Plant(Object):
         if not self.pk or not self.location:
             return
             
-        # Skapa kompostobjekt
-        compost = create_object(
-            Compost,
-            key="kompost",
-            location=self.location
-        )
-        
-        # Sätt kompostens attribut
-        compost.db.source_plant = self.key
-        compost.db.nutrients = 10
-        
+        location = self.location
+        plant_key = self.key
+        # Tillväxtuppgiften ligger under växtens dbref, samma nyckel som i
+        # at_object_creation. Efter delete() är pk None, så spara den först.
+        plant_dbref = self.dbref
+
+        # Skapa komposten och ta bort växten i en och samma transaktion.
+        # En rollback ångrar bara databasraderna, inte hooks eller cachar,
+        # så meddelanden och hanterarens tillstånd hålls utanför blocket.
+        with transaction.atomic():
+            compost = create_object(
+                Compost,
+                key="kompost",
+                location=location
+            )
+
+            # Sätt kompostens attribut
+            compost.attributes.batch_add(("source_plant", plant_key), ("nutrients", 10))
+
+            # Ta bort växten
+            self.delete()
+
+        ON_DEMAND_HANDLER.remove(plant_dbref, category="plant_growth")
+        _GROWTH_ARMED.discard(plant_dbref)
+
         # Meddela rummet
-        self.location.msg_contents(
-            f"|yEn {self.key} har dött och förvandlats till en komposthög.|n"
+        location.msg_contents(
+            f"|yEn {plant_key} har dött och förvandlats till en komposthög.|n"
         )
-        
-        # Ta bort växten
-        ON_DEMAND_HANDLER.remove(self, category="plant_growth")
-        self.delete()
 
-    def at_pre_delete(self):
+    def at_object_delete(self):
         """
         Körs precis innan objektet tas bort från databasen.
         Se till att frön sprids även vid oväntad borttagning.
+        Returnerar föräldrans svar, så att borttagningen inte stoppas,
+        inte ens om fröspridningen misslyckas.
         """
-        self.scatter_seeds()
-        super().at_pre_delete()
+        if not self.ndb.seeds_scattered and self.location:
+            try:
+                self.scatter_seeds()
+            except Exception:
+                logger.log_trace(f"Could not scatter seeds for {self.dbref} on delete")
+        return super().at_object_delete()
 
     def get_appearance(self):
         """
         Hämta växtens aktuella beskrivning.
+
+        Läser bara ögonblicksbilden i ndb.state, så att stadium och frukter
+        alltid kommer från samma källa. Ändrar aldrig växtens tillstånd;
+        stadiebytena körs av PLANT_SCHEDULER.
         """
-        try:
-            current_stage = ON_DEMAND_HANDLER.get_stage(self, category="plant_growth")
-            self.update_stage(current_stage)
-        except Exception as e:
-            current_stage = self.db.stage
-            
-        stage_desc = {
-            "seed": "Ett litet frö som precis planterats.",
-            "sprout": "En späd grodd som just tittat upp ur jorden.",
-            "young": "En ung och livskraftig planta.",
-            "mature": "En stark och fullvuxen växt.",
-            "flowering": f"En vacker blomstrande växt med {self.db.fruits} knoppar.",
-            "harvestable": f"En mogen växt redo att skördas med {self.db.fruits} frukter.",
-            "withering": "En vissnande växt som har sett bättre dagar."
-        }
-        
-        return stage_desc.get(current_stage, "En vanlig växt.")
+        return self._render_description(self.get_state()["stage"])
+
+    def _render_description(self, stage):
+        """
+        Beskriv växten i det givna stadiet.
+        """
+        desc = self._STAGE_DESC_STATIC.get(stage)
+        if desc is None and stage in self._STAGE_DESC_FRUIT_FMT:
+            # Läs frukterna bara när stadiet faktiskt visar dem
+            desc = self._STAGE_DESC_FRUIT_FMT[stage].format(fruits=self.get_state()["fruits"])
+
+        return desc or "En vanlig växt."
 
     def return_appearance(self, looker, **kwargs):
         """
@@ -197,6 +389,22 @@ class Plant(Object):
         return f"{appearance}\n{desc}"
 
 
+def schedule_all_plants():
+    """
+    Schemalägg tillväxten för alla växter i databasen.
+
+    Anropas via utils.delay från at_server_start, eftersom PLANT_SCHEDULER
+    bara finns i minnet och at_init inte körs för växter som ingen laddar
+    efter en omstart. Fördröjningen låter ON_DEMAND_HANDLER hinna laddas,
+    vilket äldre växter utan sparad starttid behöver.
+    """
+    for plant in Plant.objects.all_family():
+        try:
+            plant.schedule_growth()
+        except Exception:
+            logger.log_trace(f"Could not reschedule growth for {plant.dbref}")
+
+
 class Seed(Object):
     """A seed that can be planted to grow into a plant, and might grow on its own."""
 
@@ -205,31 +413,56 @@ class Seed(Object):
         super().at_object_creation()
         self.db.plant_type = None  # Type of plant this will grow into
 
-        # Schemalägg potentiell självplantering
+        # Tidpunkt för nästa självplantering, kontrolleras av rummet
         growth_check_time = randint(300, 900)  # 5-15 minuter
-        utils.delay(growth_check_time, self.check_natural_growth)
+        self.db.next_growth_check_ts = time() + growth_check_time
+
+    def at_post_move(self, source_location, move_type="move", **kwargs):
+        """
+        Starta om väntetiden när fröet hamnar på marken i ett rum.
+        Bara tid på marken räknas, så buret frö samlar inga kontroller.
+        """
+        super().at_post_move(source_location, move_type=move_type, **kwargs)
+        if self.location and self.location.location is None:
+            self.db.next_growth_check_ts = time() + randint(300, 900)  # 5-15 minuter
 
-    def check_natural_growth(self):
+    def growth_checks_due(self, now):
+        """
+        Räkna hur många kontroller som har förfallit fram till `now`.
+
+        Varje kontroll följs av en ny på 5-15 minuter, precis som den gamla
+        timern. Tidpunkten flyttas fram förbi `now` så att varje intervall
+        bara räknas en gång. Frön utan sparad tidpunkt har en kontroll som
+        förfallit.
+        """
+        next_check = self.db.next_growth_check_ts
+        if next_check is None:
+            next_check = now
+        checks = 0
+        while next_check <= now:
+            checks += 1
+            next_check += randint(300, 900)  # 5-15 minuter
+        if checks:
+            self.db.next_growth_check_ts = next_check
+        return checks
+
+    def check_natural_growth(self, checks=1):
         """
         Kontrollera om fröet ska gro av sig själv.
+
+        Varje kontroll har 10% chans att lyckas, så `checks` kontroller slås
+        ihop till ett slag med chansen 1 - 0.9**checks.
         """
-        # Debug: Start av kontroll
-        self.location.msg_contents(f"|yDEBUG: Checking if {self.key} should grow naturally.|n")
-    
         if not self.location:
             return
         
         # Kontrollera om platsen är ett rum genom att se om den har en location
         # Rum har ingen location (är på "topp-nivå")
         if self.location.location is not None:
-            self.location.msg_contents(f"|rDEBUG: {self.key} not on ground (in room).|n")
             return
             
-        # 10% chans att gro
-        growth_roll = random()
-        self.location.msg_contents(f"|yDEBUG: Growth roll for {self.key}: {growth_roll} (needs < 0.1 to grow)|n")
-    
-        if random() < 0.1:
+        # 10% chans att gro per kontroll
+        if random() < 1 - 0.9 ** checks:
             # Skapa växten
             try:
                 new_plant = create_object(
@@ -241,19 +474,10 @@ class Seed(Object):
                 self.location.msg_contents(
                     f"A {self.db.plant_type} sprouts from a seed on the ground."
                 )
-                # Debug: Framgångsrik groning
-                self.location.msg_contents(f"|gDEBUG: {self.key} successfully sprouted into a plant.|n")
                 # Ta bort fröet
                 self.delete()
             except Exception as e:
                 self.location.msg_contents(f"Error growing plant: {e}")
-        else:
-            # Om fröet inte grodde, schemalägg en ny kontroll
-            growth_check_time = randint(300, 900)  # 5-15 minuter
-            self.location.msg_contents(
-                f"|yDEBUG: {self.key} did not sprout. Next check in {growth_check_time} seconds.|n"
-            )
-            utils.delay(growth_check_time, self.check_natural_growth)
 
     def return_appearance(self, looker, **kwargs):
         """Show what type of plant this seed will grow."""
@@ -5,9 +5,12 @@ Rooms are simple containers that has no location of their own.
 
 """
 
+from time import time
+
 from evennia.objects.objects import DefaultRoom
 
 from .objects import ObjectParent
+from .plants import Seed
 
 
 class Room(ObjectParent, DefaultRoom):
@@ -21,4 +24,24 @@ class Room(ObjectParent, DefaultRoom):
     properties and methods available on all Objects.
     """
 
-    pass
+    def check_seed_growth(self):
+        """
+        Let seeds on the ground roll for every sprout check they have missed.
+
+        Seeds keep no timers of their own; they are only evaluated when
+        the room is looked at, which includes the automatic look made on
+        entering it.
+        """
+        now = time()
+        for obj in self.contents:
+            if isinstance(obj, Seed):
+                checks = obj.growth_checks_due(now)
+                if checks:
+                    obj.check_natural_growth(checks)
+
+    def return_appearance(self, looker, **kwargs):
+        """
+        Catch up on seed growth before the room is described.
+        """
+        self.check_seed_growth()
+        return super().return_appearance(looker, **kwargs)